@@ -1,11 +1,12 @@
 from typing import Iterable, List, Tuple
 
 import numpy
-import scipy
 import click
 import json
 
 from .embeddings import Embedder
+from .cache import EmbeddingCache
+from .daemon import request_daemon
 
 
 _VECTOR_DTYPE = numpy.dtype("float32")
@@ -16,6 +17,8 @@ _DEFAULT_DATABASE = "answers.json"
 _DEFAULT_VECTORS = "answer-vectors.npz"
 _DEFAULT_EMBEDDER = "embedder.npz"
 _DEFAULT_ENCODING = "UTF-8"
+_DEFAULT_SOCKET = "answers.sock"
+_DEFAULT_CACHE = "embedding-cache"
 
 
 class Answer(object):
@@ -31,7 +34,7 @@ class Answer(object):
 
 
 class AnswerDatabase(object):
-    def __init__(self, embedder: Embedder, embedding_size: int = None, question_answer_pairs: List[Tuple[str, str]] = None, vectors: numpy.ndarray = None, leaf_size: int = _DEFAULT_LEAF_SIZE) -> None:
+    def __init__(self, embedder: Embedder, embedding_size: int = None, question_answer_pairs: List[Tuple[str, str]] = None, vectors: numpy.ndarray = None, leaf_size: int = _DEFAULT_LEAF_SIZE, cache: EmbeddingCache = None) -> None:
         if (question_answer_pairs is None) != (vectors is None):
             raise ValueError("answers and answer_vectors must either both be included or both be excluded!")
         if embedding_size is None and question_answer_pairs is None:
@@ -41,35 +44,49 @@ class AnswerDatabase(object):
         self._question_answer_pairs = question_answer_pairs if question_answer_pairs is not None else []
         self._vectors = vectors if vectors is not None else numpy.ndarray(shape=(0, 2, embedding_size), dtype=_VECTOR_DTYPE)
         self._leaf_size = leaf_size
-        if self._vectors.shape[0] > 0:
-            distances = scipy.spatial.distance.pdist(self._vectors[:, 0, :], metric=_PAIRWISE_DISTANCE_METRIC)
-            self._max_distance = numpy.asscalar(distances.max())
-            self._tree = scipy.spatial.cKDTree(self._vectors[:, 0, :], leafsize=self._leaf_size)
+        self._cache = cache
+        self._build_index()
 
-    def add_answer(self, question: str, answer: str) -> None:
-        self._question_answer_pairs.append((question, answer))
+    @property
+    def embedder(self) -> Embedder:
+        return self._embedder
+
+    def _build_index(self) -> None:
+        if self._vectors.shape[0] == 0:
+            return
+
+        from scipy.spatial.distance import pdist
+        from scipy.spatial import cKDTree
+        distances = pdist(self._vectors[:, 0, :], metric=_PAIRWISE_DISTANCE_METRIC)
+        self._max_distance = float(distances.max())
+        self._tree = cKDTree(self._vectors[:, 0, :], leafsize=self._leaf_size)
+
+    def _embed_all(self, texts: List[str]) -> numpy.ndarray:
+        if self._cache is not None:
+            return self._cache.embed_all(self._embedder, texts)
 
-        vectors = numpy.ndarray(shape=(1, 2, self._answer_vectors.shape[2]), dtype=self._vectors.dtype)
-        vectors[0][0], vectors[0][1] = self._embedder.embed(question), self._embedder.embed(answer)
+        vectors = numpy.ndarray(shape=(len(texts), self._vectors.shape[2]), dtype=self._vectors.dtype)
+        for i, text in enumerate(texts):
+            vectors[i] = self._embedder.embed(text)
+        return vectors
 
+    def add_answer(self, question: str, answer: str) -> None:
+        vectors = self._embed_all([question, answer]).reshape((1, 2, self._vectors.shape[2]))
+
+        self._question_answer_pairs.append((question, answer))
         self._vectors = numpy.append(self._vectors, vectors, axis=0)
-        if self._vectors.shape[0] > 0:
-            distances = scipy.spatial.distance.pdist(self._vectors[:, 0, :], metric=_PAIRWISE_DISTANCE_METRIC)
-            self._max_distance = numpy.asscalar(distances.max())
-            self._tree = scipy.spatial.cKDTree(self._vectors[:, 0, :], leafsize=self._leaf_size)
+        self._build_index()
 
     def add_answers(self, question_answer_pairs: Iterable[Tuple[str, str]]) -> None:
-        vectors = numpy.ndarray(shape=(len(question_answer_pairs), 2, self._vectors.shape[2]), dtype=self._vectors.dtype)
+        question_answer_pairs = list(question_answer_pairs)
+        texts = [text for pair in question_answer_pairs for text in pair]
+        vectors = self._embed_all(texts).reshape((len(question_answer_pairs), 2, self._vectors.shape[2]))
 
-        for i, pair in enumerate(question_answer_pairs):
-            self._question_answer_pairs.append(pair)
-            vectors[i][0], vectors[i][1] = self._embedder.embed(pair[0]), self._embedder.embed(pair[1])
+        # Only touch the database once every text embedded, so pairs and vectors stay in step on failure
+        self._question_answer_pairs.extend(question_answer_pairs)
 
         self._vectors = numpy.append(self._vectors, vectors, axis=0)
-        if self._vectors.shape[0] > 0:
-            distances = scipy.spatial.distance.pdist(self._vectors[:, 0, :], metric=_PAIRWISE_DISTANCE_METRIC)
-            self._max_distance = numpy.asscalar(distances.max())
-            self._tree = scipy.spatial.cKDTree(self._vectors[:, 0, :], leafsize=self._leaf_size)
+        self._build_index()
 
     def save(self, answers_path: str = _DEFAULT_DATABASE, vectors_path: str = _DEFAULT_VECTORS, embedder_path: str = _DEFAULT_EMBEDDER, encoding: str = _DEFAULT_ENCODING) -> None:
         with open(vectors_path, "wb") as out_file:
@@ -127,14 +144,16 @@ def _main() -> None:
 @click.option("--vectors", "-v", default=_DEFAULT_VECTORS, help="The path to put the question/answer vectors", show_default=True)
 @click.option("--embedder", "-e", default=_DEFAULT_EMBEDDER, help="The embedder model file path", show_default=True)
 @click.option("--encoding", "-c", default=_DEFAULT_ENCODING, help="The text encoding to use when writing the file", show_default=True)
-def _create(answers: str = _DEFAULT_ANSWERS, database: str = _DEFAULT_DATABASE, vectors: str = _DEFAULT_VECTORS, embedder: str = _DEFAULT_EMBEDDER, encoding: str = _DEFAULT_ENCODING) -> None:
+@click.option("--cache", "-k", default=_DEFAULT_CACHE, help="The directory of cached embeddings to reuse across rebuilds", show_default=True)
+@click.option("--use-cache/--no-cache", default=True, help="Whether to reuse embeddings from the cache", show_default=True)
+def _create(answers: str = _DEFAULT_ANSWERS, database: str = _DEFAULT_DATABASE, vectors: str = _DEFAULT_VECTORS, embedder: str = _DEFAULT_EMBEDDER, encoding: str = _DEFAULT_ENCODING, cache: str = _DEFAULT_CACHE, use_cache: bool = True) -> None:
     embed = Embedder.load(embedder)
 
     with open(answers, "r", encoding=encoding) as in_file:
         answers = json.load(in_file)
 
-    example = embed.embed(next(iter(answers.keys())))
-    answer_db = AnswerDatabase(embedder=embed, embedding_size=example.shape[0])
+    embedding_cache = EmbeddingCache.for_embedder(cache, embed) if use_cache else None
+    answer_db = AnswerDatabase(embedder=embed, embedding_size=embed.dimensions, cache=embedding_cache)
     answer_db.add_answers([(question, answer) for question, answer in answers.items()])
     answer_db.save(database, vectors, embedder)
 
@@ -144,11 +163,36 @@ def _create(answers: str = _DEFAULT_ANSWERS, database: str = _DEFAULT_DATABASE,
 @click.option("--database", "-d", default=_DEFAULT_DATABASE, help="The path to the answer DB file", show_default=True)
 @click.option("--vectors", "-v", default=_DEFAULT_VECTORS, help="The path to the question/answer vectors", show_default=True)
 @click.option("--embedder", "-e", default=_DEFAULT_EMBEDDER, help="The embedder model file path", show_default=True)
-def _answer(question: str, database: str = _DEFAULT_DATABASE, vectors: str = _DEFAULT_VECTORS, embedder: str = _DEFAULT_EMBEDDER) -> None:
-    answer_db = AnswerDatabase.load(database, vectors, embedder)
-    answer = answer_db.get_answer(question)
+@click.option("--socket", "-s", default=_DEFAULT_SOCKET, help="The socket of a running answer daemon to use instead of loading the database", show_default=True)
+def _answer(question: str, database: str = _DEFAULT_DATABASE, vectors: str = _DEFAULT_VECTORS, embedder: str = _DEFAULT_EMBEDDER, socket: str = _DEFAULT_SOCKET) -> None:
+    response = request_daemon(socket, command="answer", question=question, database=database, vectors=vectors, embedder=embedder)
+    if response is not None:
+        answer = Answer(**response)
+    else:
+        answer_db = AnswerDatabase.load(database, vectors, embedder)
+        answer = answer_db.get_answer(question)
     print("{} - {}".format(answer.content, answer.confidence))
 
 
+@_main.command(name="gc", help="Drop cached embeddings that no answer database uses anymore")
+@click.option("--cache", "-k", default=_DEFAULT_CACHE, help="The directory of cached embeddings", show_default=True)
+@click.option("--database", "-d", default=(_DEFAULT_DATABASE,), multiple=True, help="An answer DB file whose embeddings should be kept (can be repeated)", show_default=True)
+@click.option("--encoding", "-c", default=_DEFAULT_ENCODING, help="The text encoding of the DB files", show_default=True)
+def _gc(cache: str = _DEFAULT_CACHE, database: Tuple[str, ...] = (_DEFAULT_DATABASE,), encoding: str = _DEFAULT_ENCODING) -> None:
+    texts = set()
+    for path in database:
+        with open(path, "r", encoding=encoding) as in_file:
+            for question, answer in json.load(in_file):
+                texts.add(question)
+                texts.add(answer)
+
+    try:
+        embedding_cache = EmbeddingCache(cache)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    removed = embedding_cache.gc(texts)
+    print("Removed {} cached embeddings, {} remain".format(removed, len(embedding_cache)))
+
+
 if __name__ == "__main__":
     _main()
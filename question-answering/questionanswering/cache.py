@@ -0,0 +1,190 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+from contextlib import contextmanager
+import hashlib
+import fcntl
+import json
+import os
+
+import numpy
+
+from .embeddings import Embedder
+
+
+_VECTOR_DTYPE = numpy.dtype("float32")
+_KEY_SIZE = 16
+_TEXT_ENCODING = "UTF-8"
+_META_FILE = "meta.json"
+_KEYS_FILE = "keys.bin"
+_VECTORS_FILE = "vectors.f32"
+_LOCK_FILE = "lock"
+
+_MODEL_KEY = "model"
+_DIMENSIONS_KEY = "dimensions"
+
+
+class EmbeddingCache(object):
+    # Append-only store of text embeddings, keyed by a hash of the embedder fingerprint and the exact text.
+    # vectors.f32 holds raw rows that are memory-mapped for reading, and keys.bin holds the matching row keys.
+    def __init__(self, directory: str, model: str = None, dimensions: int = None) -> None:
+        if (model is None) != (dimensions is None):
+            raise ValueError("model and dimensions must either both be included or both be excluded!")
+
+        self._directory = directory
+        if model is None and not os.path.exists(self._path(_META_FILE)):
+            raise ValueError("No embedding cache exists at {}!".format(directory))
+        os.makedirs(self._directory, exist_ok=True)
+
+        with self._locked():
+            meta = self._read_meta()
+            if model is None:
+                model, dimensions = meta[_MODEL_KEY], meta[_DIMENSIONS_KEY]
+
+            self._model = model
+            self._dimensions = dimensions
+
+            # A different embedder invalidates every entry, so start over
+            if meta is None or meta[_MODEL_KEY] != model or meta[_DIMENSIONS_KEY] != dimensions:
+                self._write([], numpy.ndarray(shape=(0, self._dimensions), dtype=_VECTOR_DTYPE))
+            self._load()
+
+    @classmethod
+    def for_embedder(cls, directory: str, embedder: Embedder) -> "EmbeddingCache":
+        return cls(directory=directory, model=embedder.fingerprint(), dimensions=embedder.dimensions)
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self._directory, filename)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # keys.bin and vectors.f32 are written separately, so every writer (and the reload after it) must be serialized
+        # across processes or two appends could interleave and pair keys with the wrong rows
+        with open(self._path(_LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> Optional[Dict[str, object]]:
+        try:
+            with open(self._path(_META_FILE), "r") as in_file:
+                return json.load(in_file)
+        except FileNotFoundError:
+            return None
+
+    def _key(self, text: str) -> bytes:
+        hasher = hashlib.blake2b(digest_size=_KEY_SIZE)
+        hasher.update(self._model.encode(_TEXT_ENCODING))
+        hasher.update(b"\0")
+        hasher.update(text.encode(_TEXT_ENCODING))
+        return hasher.digest()
+
+    def _load(self) -> None:
+        with open(self._path(_KEYS_FILE), "rb") as in_file:
+            keys = in_file.read()
+
+        row_size = self._dimensions * _VECTOR_DTYPE.itemsize
+        rows = min(len(keys) // _KEY_SIZE, os.path.getsize(self._path(_VECTORS_FILE)) // row_size)
+
+        # Drop any partially written tail left behind by an interrupted append
+        if len(keys) != rows * _KEY_SIZE:
+            with open(self._path(_KEYS_FILE), "r+b") as out_file:
+                out_file.truncate(rows * _KEY_SIZE)
+        if os.path.getsize(self._path(_VECTORS_FILE)) != rows * row_size:
+            with open(self._path(_VECTORS_FILE), "r+b") as out_file:
+                out_file.truncate(rows * row_size)
+
+        self._index = {keys[i * _KEY_SIZE:(i + 1) * _KEY_SIZE]: i for i in range(rows)}
+        if rows > 0:
+            self._vectors = numpy.memmap(self._path(_VECTORS_FILE), dtype=_VECTOR_DTYPE, mode="r", shape=(rows, self._dimensions))
+        else:
+            self._vectors = numpy.ndarray(shape=(0, self._dimensions), dtype=_VECTOR_DTYPE)
+
+    def _write(self, keys: List[bytes], vectors: numpy.ndarray) -> None:
+        # Write the replacement files next to the old ones and swap them in, so readers never see a half-written cache
+        for filename, content in ((_VECTORS_FILE, vectors.astype(_VECTOR_DTYPE, copy=False).tobytes()), (_KEYS_FILE, b"".join(keys))):
+            with open(self._path(filename + ".tmp"), "wb") as out_file:
+                out_file.write(content)
+            os.replace(self._path(filename + ".tmp"), self._path(filename))
+
+        with open(self._path(_META_FILE + ".tmp"), "w") as out_file:
+            json.dump({_MODEL_KEY: self._model, _DIMENSIONS_KEY: self._dimensions}, out_file)
+        os.replace(self._path(_META_FILE + ".tmp"), self._path(_META_FILE))
+
+    def _reload(self) -> None:
+        # Must hold the lock. The files may have been reset for another embedder, whose rows _load would misread
+        meta = self._read_meta()
+        if meta is None or meta[_MODEL_KEY] != self._model or meta[_DIMENSIONS_KEY] != self._dimensions:
+            raise ValueError("Embedding cache at {} was reset for a different embedder!".format(self._directory))
+        self._load()
+
+    def _append(self, embedded: Dict[bytes, numpy.ndarray]) -> None:
+        # Must hold the lock, and have reloaded under it, so keys.bin and vectors.f32 can't be interleaved with another writer
+        # Another process may have cached some of these since we last looked
+        new = [key for key in embedded if key not in self._index]
+        if not new:
+            return
+
+        vectors = numpy.array([embedded[key] for key in new], dtype=_VECTOR_DTYPE)
+        # Vectors go first so a crash can only leave rows without keys, which _load trims
+        with open(self._path(_VECTORS_FILE), "ab") as out_file:
+            out_file.write(vectors.tobytes())
+        with open(self._path(_KEYS_FILE), "ab") as out_file:
+            out_file.write(b"".join(new))
+        self._load()
+
+    def _embed_missing(self, embedder: Embedder, keys: List[bytes], texts: List[str], embedded: Dict[bytes, numpy.ndarray]) -> None:
+        for key, text in zip(keys, texts):
+            if key in self._index or key in embedded:
+                continue
+
+            vector = numpy.asarray(embedder.embed(text), dtype=_VECTOR_DTYPE)
+            if not numpy.all(numpy.isfinite(vector)):
+                raise ValueError("Embedding of {!r} is not finite!".format(text))
+            embedded[key] = vector
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, text: str) -> bool:
+        return self._key(text) in self._index
+
+    def get(self, text: str) -> Optional[numpy.ndarray]:
+        try:
+            return self._vectors[self._index[self._key(text)]]
+        except KeyError:
+            return None
+
+    def embed_all(self, embedder: Embedder, texts: List[str]) -> numpy.ndarray:
+        keys = [self._key(text) for text in texts]
+        if not keys:
+            return numpy.ndarray(shape=(0, self._dimensions), dtype=_VECTOR_DTYPE)
+
+        # Embedding is the slow part, so do it before taking the lock
+        embedded = {}
+        self._embed_missing(embedder, keys, texts, embedded)
+        if not embedded:
+            return self._vectors[[self._index[key] for key in keys]]
+
+        with self._locked():
+            self._reload()
+            # gc may have dropped entries that were hits before the reload
+            self._embed_missing(embedder, keys, texts, embedded)
+            self._append(embedded)
+            return self._vectors[[self._index[key] for key in keys]]
+
+    def gc(self, texts: Iterable[str]) -> int:
+        referenced = set(self._key(text) for text in texts)
+        with self._locked():
+            self._reload()
+            keep = [(key, row) for key, row in self._index.items() if key in referenced]
+            removed = len(self._index) - len(keep)
+            if removed == 0:
+                return 0
+
+            keep.sort(key=lambda item: item[1])
+            vectors = numpy.array(self._vectors[[row for _, row in keep]], dtype=_VECTOR_DTYPE).reshape((len(keep), self._dimensions))
+            self._vectors = None
+            self._write([key for key, _ in keep], vectors)
+            self._load()
+        return removed
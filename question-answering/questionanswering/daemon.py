@@ -0,0 +1,164 @@
+from typing import Any, Dict, Optional, Tuple
+import socketserver
+import threading
+import socket
+import json
+import stat
+import os
+
+import click
+
+
+_DEFAULT_SOCKET = "answers.sock"
+_DEFAULT_DATABASE = "answers.json"
+_DEFAULT_VECTORS = "answer-vectors.npz"
+_DEFAULT_EMBEDDER = "embedder.npz"
+_DEFAULT_ENCODING = "UTF-8"
+_CONNECT_TIMEOUT = 0.5
+_REQUEST_TIMEOUT = 30.0
+
+_COMMAND_KEY = "command"
+_ERROR_KEY = "error"
+_PATH_KEYS = ["database", "vectors", "embedder"]
+
+
+def request_daemon(socket_path: str, command: str, **fields: Any) -> Optional[Dict[str, Any]]:
+    # Returns None if no daemon is listening or it can't serve the request, so callers can fall back to loading in-process
+    if not os.path.exists(socket_path):
+        return None
+
+    request = {key: os.path.abspath(value) if key in _PATH_KEYS else value for key, value in fields.items()}
+    request[_COMMAND_KEY] = command
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(_CONNECT_TIMEOUT)
+            connection.connect(socket_path)
+            connection.settimeout(_REQUEST_TIMEOUT)
+            connection.sendall("{}\n".format(json.dumps(request)).encode(_DEFAULT_ENCODING))
+            with connection.makefile("r", encoding=_DEFAULT_ENCODING) as in_file:
+                line = in_file.readline()
+    except OSError:
+        return None
+
+    if not line:
+        return None
+    try:
+        response = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(response, dict) or _ERROR_KEY in response:
+        return None
+    return response
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, paths: Dict[str, str]) -> None:
+        self.paths = paths
+        self._lock = threading.Lock()
+        self._load()
+        super().__init__(socket_path, _DaemonHandler)
+
+    def _stat(self) -> Dict[str, Tuple[int, int]]:
+        stats = {}
+        for key, path in self.paths.items():
+            result = os.stat(path)
+            stats[key] = (result.st_mtime_ns, result.st_size)
+        return stats
+
+    def _load(self) -> None:
+        from .answers import AnswerDatabase
+        stats = self._stat()
+        self._answer_database = AnswerDatabase.load(self.paths["database"], self.paths["vectors"], self.paths["embedder"])
+        self._stats = stats
+
+    @property
+    def answer_database(self) -> Any:
+        # Reload if any of the files were rewritten (e.g. by "answers create") since they were loaded
+        with self._lock:
+            if self._stat() != self._stats:
+                self._load()
+            return self._answer_database
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            request = None
+            try:
+                request = json.loads(line.decode(_DEFAULT_ENCODING))
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be a JSON object!")
+                response = self._respond(request)
+            except Exception as e:
+                response = {_ERROR_KEY: str(e)}
+
+            self.wfile.write("{}\n".format(json.dumps(response)).encode(_DEFAULT_ENCODING))
+            self.wfile.flush()
+
+            if isinstance(request, dict) and request.get(_COMMAND_KEY) == "stop":
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+    def _respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        for key in _PATH_KEYS:
+            if key in request and request[key] != self.server.paths[key]:
+                raise ValueError("Daemon is serving a different {} file!".format(key))
+
+        command = request[_COMMAND_KEY]
+        if command == "answer":
+            return self.server.answer_database.get_answer(request["question"]).to_serializable()
+        if command == "embed":
+            return {"vector": self.server.answer_database.embedder.embed(request["text"]).tolist()}
+        if command in ("ping", "stop"):
+            return self.server.paths
+        raise ValueError("Unknown command \"{}\"!".format(command))
+
+
+@click.group(help="Keep an answer database resident to serve CLI queries quickly")
+def _main() -> None:
+    pass
+
+
+@_main.command(name="start", help="Run the answer daemon in the foreground")
+@click.option("--socket", "-s", default=_DEFAULT_SOCKET, help="The Unix domain socket to listen on", show_default=True)
+@click.option("--database", "-d", default=_DEFAULT_DATABASE, help="The path to the answer DB file", show_default=True)
+@click.option("--vectors", "-v", default=_DEFAULT_VECTORS, help="The path to the question/answer vectors", show_default=True)
+@click.option("--embedder", "-e", default=_DEFAULT_EMBEDDER, help="The embedder model file path", show_default=True)
+def _start(socket: str = _DEFAULT_SOCKET, database: str = _DEFAULT_DATABASE, vectors: str = _DEFAULT_VECTORS, embedder: str = _DEFAULT_EMBEDDER) -> None:
+    if request_daemon(socket, command="ping") is not None:
+        raise click.ClickException("A daemon is already listening on {}!".format(socket))
+    if os.path.exists(socket):
+        # Only clear out a stale socket, never some other file given by mistake
+        if not stat.S_ISSOCK(os.stat(socket).st_mode):
+            raise click.ClickException("{} exists and is not a socket!".format(socket))
+        os.remove(socket)
+
+    paths = {
+        "database": os.path.abspath(database),
+        "vectors": os.path.abspath(vectors),
+        "embedder": os.path.abspath(embedder)
+    }
+
+    server = _DaemonServer(socket, paths)
+    print("Serving {} on {}".format(database, socket))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket)
+
+
+@_main.command(name="stop", help="Stop a running answer daemon")
+@click.option("--socket", "-s", default=_DEFAULT_SOCKET, help="The Unix domain socket the daemon listens on", show_default=True)
+def _stop(socket: str = _DEFAULT_SOCKET) -> None:
+    if request_daemon(socket, command="stop") is None:
+        raise click.ClickException("No daemon is listening on {}!".format(socket))
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,12 +1,13 @@
-from typing import List
+from typing import TYPE_CHECKING, Callable, List
 
-from gensim.parsing.preprocessing import preprocess_string, strip_tags, strip_punctuation, strip_multiple_whitespaces, remove_stopwords
-from gensim.models.word2vec import Word2Vec
-from gensim.models import KeyedVectors
-from sklearn.preprocessing import normalize
-import gensim.downloader as api
 import numpy
 import click
+import hashlib
+
+from .daemon import request_daemon
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
 
 
 _DEFAULT_DATASET = "text8"
@@ -14,6 +15,7 @@ _DEFAULT_MODEL = "embedder.npz"
 _DEFAULT_DATA_OUT = "dataset.txt"
 _DEFAULT_DATA_IN = "data.txt"
 _DEFAULT_ENCODING = "UTF-8"
+_DEFAULT_SOCKET = "answers.sock"
 _DEFAULT_EMBEDDING_SIZE = 300
 _DEFAULT_GRAM_SIZE = 5
 _DEFAULT_MIN_COUNT = 5
@@ -21,23 +23,37 @@ _DEFAULT_WORKERS = 3
 _DEFAULT_SKIPGRAM = False
 _DEFAULT_HIERARCHICAL_SOFTMAX = False
 _DEFAULT_NEGATIVE_SAMPLES = 5
-_PREPROCESSING_FILTERS = [
-    lambda x: x.lower(),
-    strip_tags,
-    strip_punctuation,
-    strip_multiple_whitespaces,
-    remove_stopwords
-]
+
+
+# gensim takes seconds to import, so it's only pulled in by the code paths that need it
+def _preprocessing_filters() -> List[Callable[[str], str]]:
+    from gensim.parsing.preprocessing import strip_tags, strip_punctuation, strip_multiple_whitespaces, remove_stopwords
+    return [
+        lambda x: x.lower(),
+        strip_tags,
+        strip_punctuation,
+        strip_multiple_whitespaces,
+        remove_stopwords
+    ]
+
+
+def _preprocess(text: str) -> List[str]:
+    from gensim.parsing.preprocessing import preprocess_string
+    return preprocess_string(text, _preprocessing_filters())
 
 
 class Embedder(object):
-    def __init__(self, model: KeyedVectors) -> None:
+    def __init__(self, model: "KeyedVectors") -> None:
         self._model = model
 
     @staticmethod
     def _combine(vectors: List[numpy.ndarray]) -> numpy.ndarray:
+        if not vectors:
+            raise ValueError("Text contains no words known to the embedder!")
+
         mean = numpy.average(vectors, axis=0)
-        return normalize(mean.reshape((1, mean.shape[0]))).reshape(mean.shape)
+        norm = numpy.linalg.norm(mean)
+        return mean / norm if norm > 0.0 else mean
 
     @classmethod
     def train(cls,
@@ -49,6 +65,7 @@ class Embedder(object):
               skipgram: bool = _DEFAULT_SKIPGRAM,
               hierarchical_softmax: bool = _DEFAULT_HIERARCHICAL_SOFTMAX,
               negative_samples: int = _DEFAULT_NEGATIVE_SAMPLES) -> "Embedder":
+        from gensim.models.word2vec import Word2Vec
         model = Word2Vec(
             corpus_file=corpus,
             size=embedding_size,
@@ -61,8 +78,19 @@ class Embedder(object):
         )
         return Embedder(model.wv)
 
+    @property
+    def dimensions(self) -> int:
+        return self._model.vector_size
+
+    def fingerprint(self) -> str:
+        # Hash the vectors themselves rather than the file, since save() may rewrite the file with identical weights
+        hasher = hashlib.sha256()
+        hasher.update(str(self._model.vectors.shape).encode("ascii"))
+        hasher.update(numpy.ascontiguousarray(self._model.vectors).data)
+        return hasher.hexdigest()
+
     def embed(self, text: str) -> numpy.ndarray:
-        tokens = preprocess_string(text, _PREPROCESSING_FILTERS)
+        tokens = _preprocess(text)
         vectors = []
         for token in tokens:
             try:
@@ -77,6 +105,7 @@ class Embedder(object):
 
     @classmethod
     def load(cls, filepath: str) -> "Embedder":
+        from gensim.models import KeyedVectors
         model = KeyedVectors.load(filepath)
         return Embedder(
             model=model
@@ -91,7 +120,13 @@ def _main() -> None:
 @_main.command(name="evaluate", help="Evaluate word embeddings for an existing model")
 @click.option("--text", "-t", required=True, type=str, help="The text to evaluate")
 @click.option("--model", "-m", default=_DEFAULT_MODEL, help="The model file to evaluate with", show_default=True)
-def _evaluate(text: str, model: str = _DEFAULT_MODEL) -> None:
+@click.option("--socket", "-s", default=_DEFAULT_SOCKET, help="The socket of a running answer daemon to use instead of loading the model", show_default=True)
+def _evaluate(text: str, model: str = _DEFAULT_MODEL, socket: str = _DEFAULT_SOCKET) -> None:
+    response = request_daemon(socket, command="embed", text=text, embedder=model)
+    if response is not None:
+        print(numpy.array(response["vector"], dtype=numpy.float32))
+        return
+
     embedder = Embedder.load(model)
     print(embedder.embed(text))
 
@@ -109,6 +144,7 @@ def _train(data: str, model: str = _DEFAULT_MODEL) -> None:
 @click.option("--out", "-o", default=_DEFAULT_DATA_OUT, help="The file to save the dataset to", show_default=True)
 @click.option("--encoding", "-e", default=_DEFAULT_ENCODING, help="The text encoding to use when writing the file", show_default=True)
 def _download(name: str = _DEFAULT_DATASET, out: str = _DEFAULT_DATA_OUT, encoding: str = _DEFAULT_ENCODING) -> None:
+    import gensim.downloader as api
     dataset = api.load(name)
     with open(out, "w", encoding=encoding) as out_file:
         for tokens in dataset:
@@ -122,7 +158,7 @@ def _download(name: str = _DEFAULT_DATASET, out: str = _DEFAULT_DATA_OUT, encodi
 def _append(data: str = _DEFAULT_DATA_IN, dataset: str = _DEFAULT_DATA_OUT, encoding: str = _DEFAULT_ENCODING) -> None:
     with open(data, "r", encoding=encoding) as in_file, open(dataset, "a", encoding=encoding) as out_file:
         for line in in_file:
-            tokens = preprocess_string(line, _PREPROCESSING_FILTERS)
+            tokens = _preprocess(line)
             out_file.write("{}\n".format("\t".join(tokens)))
 
 
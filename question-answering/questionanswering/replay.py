@@ -0,0 +1,200 @@
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from urllib.parse import urlsplit
+import http.client
+import threading
+import math
+import json
+import time
+
+import click
+
+from .traffic import read_traffic
+
+
+_DEFAULT_URL = "http://localhost:41170"
+_DEFAULT_SPEED = 1.0
+_DEFAULT_CONCURRENCY = 16
+_DEFAULT_TIMEOUT = 30.0
+_DEFAULT_ENCODING = "UTF-8"
+_DEFAULT_ENDPOINT = "/autoguru/answer"
+_PERCENTILES = [50, 95, 99]
+_MAX_PRINTED_DIFFERENCES = 10
+
+# (HTTP status or None if the request failed outright, decoded answer or None, latency)
+_Result = Tuple[Optional[int], Optional[Dict[str, Any]], float]
+
+
+class _Target(object):
+    def __init__(self, url: str, timeout: float = _DEFAULT_TIMEOUT) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError("Target URL must be http or https!")
+
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path.rstrip("/")
+        self._timeout = timeout
+        # One keep-alive connection per worker thread
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        try:
+            return self._local.connection
+        except AttributeError:
+            connection_type = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            self._local.connection = connection_type(self._host, self._port, timeout=self._timeout)
+            return self._local.connection
+
+    def _reset(self) -> None:
+        try:
+            self._local.connection.close()
+            del self._local.connection
+        except AttributeError:
+            pass
+
+    def ask(self, endpoint: str, body: bytes, scheduled: float) -> _Result:
+        # Latency runs from the scheduled send time, so time spent queued behind a slow server is counted too
+        headers = {"Content-Type": "application/json"}
+        try:
+            connection = self._connection()
+            connection.request("POST", self._prefix + endpoint, body=body, headers=headers)
+            response = connection.getresponse()
+            content = response.read()
+        except (http.client.HTTPException, OSError):
+            self._reset()
+            return None, None, time.perf_counter() - scheduled
+        latency = time.perf_counter() - scheduled
+
+        if response.will_close:
+            self._reset()
+        if response.status != 200:
+            return response.status, None, latency
+        try:
+            return response.status, json.loads(content.decode(_DEFAULT_ENCODING)), latency
+        except ValueError:
+            return None, None, latency
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    index = max(0, math.ceil(percent / 100.0 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def _schedule(records: List[Dict[str, Any]], speed: float, rate: Optional[float]) -> List[float]:
+    if rate is not None:
+        return [i / rate for i in range(len(records))]
+
+    # Records are written in completion order, so the earliest arrival isn't necessarily the first record
+    first = min(record["timestamp"] for record in records)
+    return [(record["timestamp"] - first) / speed for record in records]
+
+
+def _request_body(record: Dict[str, Any]) -> bytes:
+    # Recorded failures are replayed as the same kind of malformed request
+    status = record.get("status", 200)
+    if status == 500:
+        return b"{"
+    if record["question"] is None:
+        return b"{}"
+    return json.dumps({"question": record["question"]}).encode(_DEFAULT_ENCODING)
+
+
+def _replay_all(records: List[Dict[str, Any]], offsets: List[float], targets: List[_Target], concurrency: int) -> List[List[_Result]]:
+    # Each target gets its own pool of workers so a slow target can't hold up requests to the others
+    futures = [[] for _ in targets]
+    with ExitStack() as stack:
+        executors = [stack.enter_context(ThreadPoolExecutor(max_workers=concurrency)) for _ in targets]
+        start = time.perf_counter()
+        for record, offset in zip(records, offsets):
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0.0:
+                time.sleep(delay)
+
+            endpoint, body = record.get("endpoint", _DEFAULT_ENDPOINT), _request_body(record)
+            for target, executor, target_futures in zip(targets, executors, futures):
+                target_futures.append(executor.submit(target.ask, endpoint, body, scheduled))
+        return [[future.result() for future in target_futures] for target_futures in futures]
+
+
+def _report(name: str, records: List[Dict[str, Any]], offsets: List[float], results: List[_Result]) -> None:
+    # Each request completed at its scheduled offset plus its latency, so the last completion is this target's run time
+    elapsed = max(offset + latency for offset, (_, _, latency) in zip(offsets, results))
+    ordered = sorted(latency for status, _, latency in results if status is not None)
+    failures = sum(1 for record, (status, _, _) in zip(records, results) if status != record.get("status", 200))
+    print("{}: {} requests in {:.2f}s ({:.1f} requests/s), {} failed or returned an unexpected status".format(name, len(results), elapsed, len(results) / elapsed, failures))
+    if ordered:
+        print("  " + ", ".join("p{} {:.1f}ms".format(percent, _percentile(ordered, percent) * 1000.0) for percent in _PERCENTILES))
+
+
+@click.command(name="replay", help="Replay a recorded traffic log against running question answering servers")
+@click.option("--log", "-l", required=True, type=str, multiple=True, help="A JSON Lines traffic log recorded by the server's --traffic-log option (repeat to include rotated logs)")
+@click.option("--url", "-u", default=_DEFAULT_URL, help="The base URL of the server to drive", show_default=True)
+@click.option("--baseline", "-b", default=None, type=str, help="The base URL of a second server (e.g. running another database version) to compare answers against")
+@click.option("--speed", "-s", default=_DEFAULT_SPEED, help="Replay at this multiple of the originally recorded speed", show_default=True)
+@click.option("--rate", "-r", default=None, type=float, help="Replay at a fixed number of requests per second, ignoring recorded timing")
+@click.option("--concurrency", "-n", default=_DEFAULT_CONCURRENCY, help="The number of concurrent connections to use", show_default=True)
+@click.option("--limit", default=None, type=int, help="Only replay the first N recorded requests")
+@click.option("--differences", "-o", default=None, type=str, help="The JSON Lines file to write answer differences to")
+@click.option("--encoding", "-c", default=_DEFAULT_ENCODING, help="The text encoding of the traffic log", show_default=True)
+def _replay(log: Tuple[str, ...],
+            url: str = _DEFAULT_URL,
+            baseline: str = None,
+            speed: float = _DEFAULT_SPEED,
+            rate: float = None,
+            concurrency: int = _DEFAULT_CONCURRENCY,
+            limit: int = None,
+            differences: str = None,
+            encoding: str = _DEFAULT_ENCODING) -> None:
+    if speed <= 0.0:
+        raise click.BadParameter("must be positive", param_hint="--speed")
+    if rate is not None and rate <= 0.0:
+        raise click.BadParameter("must be positive", param_hint="--rate")
+
+    records = [record for path in log for record in read_traffic(path, encoding=encoding)]
+    records.sort(key=lambda record: record["timestamp"])
+    if limit is not None:
+        records = records[:limit]
+    if not records:
+        print("Traffic log is empty, nothing to replay.")
+        return
+
+    target = _Target(url)
+    baseline_target = _Target(baseline) if baseline is not None else None
+    offsets = _schedule(records, speed, rate)
+
+    targets = [target] if baseline_target is None else [target, baseline_target]
+    results = _replay_all(records, offsets, targets, concurrency)
+    _report(url, records, offsets, results[0])
+
+    if baseline_target is None:
+        return
+
+    _report(baseline, records, offsets, results[1])
+
+    compared = [
+        (record["question"], answer, baseline_answer)
+        for record, (_, answer, _), (_, baseline_answer, _) in zip(records, results[0], results[1])
+        if answer is not None and baseline_answer is not None
+    ]
+    changed = [(question, answer, baseline_answer) for question, answer, baseline_answer in compared if answer["content"] != baseline_answer["content"]]
+    print("{} of {} compared answers differ".format(len(changed), len(compared)))
+
+    for question, answer, baseline_answer in changed[:_MAX_PRINTED_DIFFERENCES]:
+        print("  {!r}: {:.3f} -> {:.3f}".format(question, baseline_answer["confidence"], answer["confidence"]))
+
+    if differences is not None:
+        with open(differences, "w", encoding=encoding) as out_file:
+            for question, answer, baseline_answer in changed:
+                out_file.write("{}\n".format(json.dumps({
+                    "question": question,
+                    "answer": answer,
+                    "baseline_answer": baseline_answer
+                })))
+
+
+if __name__ == "__main__":
+    _replay()
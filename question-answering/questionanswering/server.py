@@ -1,13 +1,14 @@
 from typing import Dict, Any
 import json
 
-from faker import Faker
 import random
+import time
 import bottle
 import click
 
 from .answers import AnswerDatabase, Answer
 from .storage import Storage
+from .traffic import TrafficLogger
 
 
 _DEFAULT_HOST = "0.0.0.0"
@@ -18,6 +19,9 @@ _DEFAULT_DATABASE = "answers.json"
 _DEFAULT_VECTORS = "answer-vectors.npz"
 _DEFAULT_EMBEDDER = "embedder.npz"
 _DEFAULT_STORAGE = "storage.json"
+_DEFAULT_TRAFFIC_LOG = None
+_DEFAULT_TRAFFIC_LOG_MAX_BYTES = 64 * 1024 * 1024
+_DEFAULT_TRAFFIC_LOG_BACKUPS = 5
 
 _CONFIDENCE_THRESHOLD = 0.5
 
@@ -28,7 +32,18 @@ _TOTAL_USERS_KEY = "total_users"
 _UNANSWERED_QUESTIONS_KEY = "unanswered_questions"
 
 
-def _initialize_services(application: bottle.Bottle, answer_database: AnswerDatabase, storage: Storage) -> None:
+def _initialize_services(application: bottle.Bottle, answer_database: AnswerDatabase, storage: Storage, traffic_logger: TrafficLogger = None) -> None:
+    def _log_traffic(arrival: float, start: float, question: str = None, answer: Answer = None, status: int = 200) -> None:
+        if traffic_logger is not None:
+            traffic_logger.log(
+                endpoint=bottle.request.path,
+                question=question,
+                confidence=answer.confidence if answer is not None else None,
+                latency=time.perf_counter() - start,
+                timestamp=arrival,
+                status=status
+            )
+
     @application.hook("after_request")
     def _enable_cors() -> None:
         bottle.response.headers["Access-Control-Allow-Origin"] = "*"
@@ -38,36 +53,46 @@ def _initialize_services(application: bottle.Bottle, answer_database: AnswerData
 
     @application.post("/autoguru/answer-stub")
     def _answer_stub() -> Dict[str, Any]:
+        arrival, start = time.time(), time.perf_counter()
         try:
             query = json.load(bottle.request.body)
         except json.decoder.JSONDecodeError:
+            _log_traffic(arrival, start, status=500)
             return bottle.HTTPError(status=500, body="Failed to decode JSON POST data!")
 
         try:
             question = query["question"]
         except KeyError:
+            _log_traffic(arrival, start, status=400)
             return bottle.HTTPError(status=400, body="POST request included no \"question\" field!")
 
         storage.increment_key(_TOTAL_QUESTIONS_KEY)
         storage.increment_key(_TOTAL_ANSWERED_QUESTIONS_KEY)
 
+        from faker import Faker
         fake = Faker()
-        return Answer(
+        answer = Answer(
             content=fake.text(),
             question=question,
             confidence=random.uniform(0.0, 1.0)
-        ).to_serializable()
+        )
+
+        _log_traffic(arrival, start, question, answer)
+        return answer.to_serializable()
 
     @application.post("/autoguru/answer")
     def _answer() -> Dict[str, Any]:
+        arrival, start = time.time(), time.perf_counter()
         try:
             query = json.load(bottle.request.body)
         except json.decoder.JSONDecodeError as e:
+            _log_traffic(arrival, start, status=500)
             return bottle.HTTPError(status=500, body="Failed to decode JSON POST data!", exception=e)
 
         try:
             question = query["question"]
         except KeyError:
+            _log_traffic(arrival, start, status=400)
             return bottle.HTTPError(status=400, body="POST request included no \"question\" field!")
 
         storage.increment_key(_TOTAL_QUESTIONS_KEY)
@@ -86,6 +111,7 @@ def _initialize_services(application: bottle.Bottle, answer_database: AnswerData
                 question=question
             )
 
+        _log_traffic(arrival, start, question, answer)
         return answer.to_serializable()
 
     @application.get("/autoguru/dashboard")
@@ -110,20 +136,31 @@ def _initialize_services(application: bottle.Bottle, answer_database: AnswerData
 @click.option("--answers", "-a", default=_DEFAULT_DATABASE, help="The path to the answer corpus", show_default=True)
 @click.option("--vectors", "-v", default=_DEFAULT_VECTORS, help="The path to the vectors for the answer corpus", show_default=True)
 @click.option("--debug/--live", "-d/-l", default=_DEFAULT_DEBUG, help="Whether to include debug logs in the server output", show_default=True)
+@click.option("--traffic-log", "-t", default=_DEFAULT_TRAFFIC_LOG, help="The JSON Lines file to record incoming questions to, for later replay", show_default=True)
+@click.option("--traffic-log-max-bytes", default=_DEFAULT_TRAFFIC_LOG_MAX_BYTES, help="The size at which the traffic log is rotated", show_default=True)
+@click.option("--traffic-log-backups", default=_DEFAULT_TRAFFIC_LOG_BACKUPS, help="The number of rotated traffic logs to keep", show_default=True)
 def _run(host: str = _DEFAULT_HOST,
          port: int = _DEFAULT_PORT,
          server: str = _DEFAULT_SERVER,
          embedder: str = _DEFAULT_EMBEDDER,
          answers: str = _DEFAULT_DATABASE,
          vectors: str = _DEFAULT_VECTORS,
-         debug: bool = _DEFAULT_DEBUG) -> None:
+         debug: bool = _DEFAULT_DEBUG,
+         traffic_log: str = _DEFAULT_TRAFFIC_LOG,
+         traffic_log_max_bytes: int = _DEFAULT_TRAFFIC_LOG_MAX_BYTES,
+         traffic_log_backups: int = _DEFAULT_TRAFFIC_LOG_BACKUPS) -> None:
     answer_database = AnswerDatabase.load(answers_path=answers, vectors_path=vectors, embedder_path=embedder)
     storage = Storage(filepath=_DEFAULT_STORAGE)
+    traffic_logger = TrafficLogger(filepath=traffic_log, max_bytes=traffic_log_max_bytes, backup_count=traffic_log_backups) if traffic_log is not None else None
 
     application = bottle.Bottle()
-    _initialize_services(application, answer_database, storage)
+    _initialize_services(application, answer_database, storage, traffic_logger)
 
-    application.run(host=host, port=port, server=server, debug=debug)
+    try:
+        application.run(host=host, port=port, server=server, debug=debug)
+    finally:
+        if traffic_logger is not None:
+            traffic_logger.close()
 
 
 if __name__ == "__main__":
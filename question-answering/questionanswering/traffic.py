@@ -0,0 +1,160 @@
+from typing import Any, Dict, Iterator, List
+
+import threading
+import queue
+import json
+import time
+import os
+
+
+_DEFAULT_ENCODING = "UTF-8"
+_DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+_DEFAULT_BACKUP_COUNT = 5
+_DEFAULT_QUEUE_SIZE = 10000
+_DEFAULT_FLUSH_INTERVAL = 1.0
+_DEFAULT_BATCH_SIZE = 512
+
+_TIMESTAMP_KEY = "timestamp"
+_ENDPOINT_KEY = "endpoint"
+_QUESTION_KEY = "question"
+_CONFIDENCE_KEY = "confidence"
+_LATENCY_KEY = "latency"
+_STATUS_KEY = "status"
+
+
+class TrafficLogger(object):
+    def __init__(self,
+                 filepath: str,
+                 max_bytes: int = _DEFAULT_MAX_BYTES,
+                 backup_count: int = _DEFAULT_BACKUP_COUNT,
+                 queue_size: int = _DEFAULT_QUEUE_SIZE,
+                 flush_interval: float = _DEFAULT_FLUSH_INTERVAL,
+                 batch_size: int = _DEFAULT_BATCH_SIZE,
+                 encoding: str = _DEFAULT_ENCODING) -> None:
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive!")
+        if backup_count < 0:
+            raise ValueError("backup_count must not be negative!")
+
+        self._filepath = filepath
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._encoding = encoding
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._closed = threading.Event()
+
+        self._open()
+
+        self._thread = threading.Thread(target=self._run, name="traffic-logger", daemon=True)
+        self._thread.start()
+
+    @property
+    def dropped(self) -> int:
+        with self._dropped_lock:
+            return self._dropped
+
+    def log(self, endpoint: str, question: str, confidence: float, latency: float, timestamp: float = None, status: int = 200) -> None:
+        if self._closed.is_set():
+            return
+
+        record = {
+            _TIMESTAMP_KEY: timestamp if timestamp is not None else time.time(),
+            _ENDPOINT_KEY: endpoint,
+            _QUESTION_KEY: question,
+            _CONFIDENCE_KEY: confidence,
+            _LATENCY_KEY: latency,
+            _STATUS_KEY: status
+        }
+        # Never block the request path: if the writer can't keep up, drop the record
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._drop(1)
+
+    def close(self) -> None:
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        self._file.close()
+
+        if self.dropped > 0:
+            print("Traffic log {} dropped {} records".format(self._filepath, self.dropped))
+
+    def _run(self) -> None:
+        while not (self._closed.is_set() and self._queue.empty()):
+            batch = self._drain()
+            if not batch:
+                continue
+
+            # A failed write (e.g. a full disk) loses this batch, but the writer keeps going
+            try:
+                if self._file.closed:
+                    self._open()
+                self._write(batch)
+            except OSError as e:
+                self._drop(len(batch))
+                print("Failed to write traffic log {}: {}".format(self._filepath, e))
+                # Discard whatever is left in the buffer; the file is reopened for the next batch
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+
+    def _drop(self, count: int) -> None:
+        # Request threads and the writer thread both drop records
+        with self._dropped_lock:
+            self._dropped += count
+
+    def _open(self) -> None:
+        self._file = open(self._filepath, "a", encoding=self._encoding)
+        self._size = self._file.tell()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        try:
+            batch = [self._queue.get(timeout=self._flush_interval)]
+        except queue.Empty:
+            return []
+
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        for record in batch:
+            line = "{}\n".format(json.dumps(record))
+            size = len(line.encode(self._encoding))
+            if self._size > 0 and self._size + size > self._max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._size += size
+        self._file.flush()
+
+    def _rotate(self) -> None:
+        self._file.close()
+
+        if self._backup_count > 0:
+            for i in range(self._backup_count - 1, 0, -1):
+                source = "{}.{}".format(self._filepath, i)
+                if os.path.exists(source):
+                    os.replace(source, "{}.{}".format(self._filepath, i + 1))
+            os.replace(self._filepath, "{}.1".format(self._filepath))
+        else:
+            os.remove(self._filepath)
+        self._open()
+
+
+def read_traffic(filepath: str, encoding: str = _DEFAULT_ENCODING) -> Iterator[Dict[str, Any]]:
+    with open(filepath, "r", encoding=encoding) as in_file:
+        for line in in_file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
@@ -9,8 +9,7 @@ install_requires = [
     "paste",
     "numpy",
     "scipy",
-    "Faker",
-    "scikit-learn"
+    "Faker"
 ]
 
 setup(
@@ -0,0 +1,210 @@
+from typing import Dict, List
+import threading
+import time
+import os
+
+import numpy
+import pytest
+
+from questionanswering import cache as cache_module
+from questionanswering import embeddings
+from questionanswering.cache import EmbeddingCache
+from questionanswering.embeddings import Embedder
+
+
+class _FakeKeyedVectors(object):
+    def __init__(self, words: Dict[str, List[float]]) -> None:
+        self._index = {word: i for i, word in enumerate(words)}
+        self.vectors = numpy.array(list(words.values()), dtype=numpy.float32)
+        self.vector_size = self.vectors.shape[1]
+
+    @property
+    def wv(self) -> "_FakeKeyedVectors":
+        return self
+
+    def __getitem__(self, word: str) -> numpy.ndarray:
+        return self.vectors[self._index[word]]
+
+
+class _CountingEmbedder(Embedder):
+    def __init__(self, model: _FakeKeyedVectors) -> None:
+        super().__init__(model)
+        self.calls = []
+
+    def embed(self, text: str) -> numpy.ndarray:
+        self.calls.append(text)
+        return super().embed(text)
+
+
+_WORDS = {
+    "engine": [1.0, 0.0, 0.0],
+    "brake": [0.0, 1.0, 0.0],
+    "tyre": [0.0, 0.0, 1.0]
+}
+
+
+@pytest.fixture(autouse=True)
+def _split_on_whitespace(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Keep gensim's preprocessing out of the tests
+    monkeypatch.setattr(embeddings, "_preprocess", lambda text: text.lower().split())
+
+
+@pytest.fixture
+def embedder() -> _CountingEmbedder:
+    return _CountingEmbedder(_FakeKeyedVectors(_WORDS))
+
+
+def test_embed_all_embeds_duplicates_once(tmp_path, embedder):
+    cache = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+
+    vectors = cache.embed_all(embedder, ["engine brake", "tyre", "engine brake"])
+
+    assert embedder.calls == ["engine brake", "tyre"]
+    assert len(cache) == 2
+    assert numpy.array_equal(vectors[0], vectors[2])
+    assert numpy.allclose(vectors[1], [0.0, 0.0, 1.0])
+
+
+def test_embed_all_reuses_entries_across_instances(tmp_path, embedder):
+    expected = EmbeddingCache.for_embedder(str(tmp_path), embedder).embed_all(embedder, ["engine", "brake"])
+    embedder.calls.clear()
+
+    cache = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+    vectors = cache.embed_all(embedder, ["brake", "engine", "tyre"])
+
+    assert embedder.calls == ["tyre"]
+    assert numpy.array_equal(vectors[0], expected[1])
+    assert numpy.array_equal(vectors[1], expected[0])
+
+
+def test_embed_all_rejects_texts_without_known_words(tmp_path, embedder):
+    cache = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+
+    with pytest.raises(ValueError):
+        cache.embed_all(embedder, ["engine", "unknown words"])
+
+    assert len(cache) == 0
+    assert os.path.getsize(os.path.join(str(tmp_path), "vectors.f32")) == 0
+
+
+def test_torn_append_is_trimmed(tmp_path, embedder):
+    cache = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+    expected = cache.embed_all(embedder, ["engine", "brake"])
+
+    with open(os.path.join(str(tmp_path), "vectors.f32"), "ab") as out_file:
+        out_file.write(numpy.ones(3, dtype=numpy.float32).tobytes() + b"\x01\x02")
+    with open(os.path.join(str(tmp_path), "keys.bin"), "ab") as out_file:
+        out_file.write(b"\xff" * 5)
+
+    cache = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+
+    assert len(cache) == 2
+    assert numpy.array_equal(cache.get("engine"), expected[0])
+    assert numpy.array_equal(cache.get("brake"), expected[1])
+    assert os.path.getsize(os.path.join(str(tmp_path), "vectors.f32")) == 2 * 3 * 4
+    assert os.path.getsize(os.path.join(str(tmp_path), "keys.bin")) == 2 * 16
+
+
+def test_fingerprint_change_resets_cache(tmp_path, embedder):
+    EmbeddingCache.for_embedder(str(tmp_path), embedder).embed_all(embedder, ["engine", "brake"])
+
+    retrained = _CountingEmbedder(_FakeKeyedVectors({**_WORDS, "engine": [0.0, 1.0, 1.0]}))
+    cache = EmbeddingCache.for_embedder(str(tmp_path), retrained)
+
+    assert len(cache) == 0
+    assert cache.get("engine") is None
+    assert numpy.allclose(cache.embed_all(retrained, ["engine"])[0], numpy.array([0.0, 1.0, 1.0]) / numpy.sqrt(2.0))
+
+
+def test_gc_keeps_referenced_rows(tmp_path, embedder):
+    cache = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+    expected = cache.embed_all(embedder, ["engine", "brake", "tyre", "engine tyre"])
+
+    assert EmbeddingCache(str(tmp_path)).gc(["tyre", "engine", "not cached"]) == 2
+
+    cache = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+    assert len(cache) == 2
+    assert numpy.array_equal(cache.get("engine"), expected[0])
+    assert numpy.array_equal(cache.get("tyre"), expected[2])
+    assert cache.get("brake") is None
+    assert cache.get("engine tyre") is None
+
+
+def test_opening_missing_cache_does_not_create_it(tmp_path):
+    directory = os.path.join(str(tmp_path), "missing")
+
+    with pytest.raises(ValueError):
+        EmbeddingCache(directory)
+
+    assert not os.path.exists(directory)
+
+
+def test_stale_instance_skips_keys_already_appended(tmp_path, embedder):
+    first = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+    second = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+
+    expected = first.embed_all(embedder, ["engine", "brake"])
+    vectors = second.embed_all(embedder, ["brake", "tyre", "engine"])
+
+    assert len(EmbeddingCache(str(tmp_path))) == 3
+    assert numpy.array_equal(vectors[0], expected[1])
+    assert numpy.array_equal(vectors[2], expected[0])
+    assert numpy.array_equal(first.embed_all(embedder, ["tyre"])[0], vectors[1])
+
+
+def test_concurrent_writers_keep_keys_and_vectors_paired(tmp_path, monkeypatch):
+    def _slow_open(path: str, mode: str = "r", *args: object, **kwargs: object) -> object:
+        # Widen the gap between appending vectors and appending their keys so unsynchronized writers would interleave
+        if mode == "ab":
+            time.sleep(0.002)
+        return open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(cache_module, "open", _slow_open, raising=False)
+    words = {"w{}".format(i): [float(i), 1.0, 0.0] for i in range(40)}
+
+    class _SlowEmbedder(Embedder):
+        def embed(self, text: str) -> numpy.ndarray:
+            time.sleep(0.001)
+            return super().embed(text)
+
+    expected = _SlowEmbedder(_FakeKeyedVectors(words))
+    EmbeddingCache.for_embedder(str(tmp_path), expected)
+    errors = []
+
+    def _writer(offset: int) -> None:
+        try:
+            embedder = _SlowEmbedder(_FakeKeyedVectors(words))
+            cache = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+            for start in range(0, 40, 5):
+                texts = ["w{}".format((offset + i) % 40) for i in range(start, start + 5)]
+                cache.embed_all(embedder, texts)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_writer, args=(offset,)) for offset in (0, 7, 13, 29)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    cache = EmbeddingCache.for_embedder(str(tmp_path), expected)
+    assert len(cache) == 40
+    for word in words:
+        assert numpy.allclose(cache.get(word), expected.embed(word))
+
+
+def test_entries_collected_mid_embed_are_re_embedded(tmp_path, embedder):
+    cache = EmbeddingCache.for_embedder(str(tmp_path), embedder)
+    expected = cache.embed_all(embedder, ["engine", "brake"])
+
+    # gc in another instance drops "engine", which this instance still thinks is cached
+    EmbeddingCache(str(tmp_path)).gc(["brake"])
+    embedder.calls.clear()
+
+    vectors = cache.embed_all(embedder, ["engine", "tyre"])
+
+    assert embedder.calls == ["tyre", "engine"]
+    assert numpy.array_equal(vectors[0], expected[0])
+    assert numpy.allclose(vectors[1], [0.0, 0.0, 1.0])
+    assert len(EmbeddingCache(str(tmp_path))) == 3
@@ -0,0 +1,120 @@
+from typing import Any, Dict, Iterator, List
+import subprocess
+import threading
+import socket
+import json
+import sys
+import os
+
+import pytest
+
+from questionanswering import answers
+from questionanswering.answers import Answer
+from questionanswering.daemon import _DaemonServer, request_daemon
+
+
+class _FakeAnswerDatabase(object):
+    def __init__(self, version: int) -> None:
+        self.version = version
+
+    def get_answer(self, question: str) -> Answer:
+        return Answer(content="{} v{}".format(question, self.version), question=question, confidence=0.75)
+
+
+@pytest.fixture
+def files(tmp_path) -> Dict[str, str]:
+    paths = {
+        "database": str(tmp_path / "answers.json"),
+        "vectors": str(tmp_path / "answer-vectors.npz"),
+        "embedder": str(tmp_path / "embedder.npz")
+    }
+    for path in paths.values():
+        with open(path, "w") as out_file:
+            out_file.write("[]")
+    return paths
+
+
+@pytest.fixture
+def loads(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    calls = []
+
+    def _load(answers_path: str, vectors_path: str, embedder_path: str) -> _FakeAnswerDatabase:
+        calls.append(answers_path)
+        return _FakeAnswerDatabase(len(calls))
+
+    monkeypatch.setattr(answers.AnswerDatabase, "load", staticmethod(_load))
+    return calls
+
+
+@pytest.fixture
+def daemon(tmp_path, files, loads) -> Iterator[str]:
+    socket_path = str(tmp_path / "d.sock")
+    server = _DaemonServer(socket_path, files)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield socket_path
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _ask(socket_path: str, files: Dict[str, str], **overrides: Any) -> Dict[str, Any]:
+    return request_daemon(socket_path, command="answer", question="why?", **{**files, **overrides})
+
+
+def test_missing_socket_falls_back(tmp_path):
+    assert request_daemon(str(tmp_path / "missing.sock"), command="ping") is None
+
+
+def test_dead_socket_falls_back(tmp_path):
+    socket_path = str(tmp_path / "dead.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(socket_path)
+
+    assert os.path.exists(socket_path)
+    assert request_daemon(socket_path, command="ping") is None
+
+
+def test_answers_from_resident_database(daemon, files, loads):
+    assert _ask(daemon, files) == {"content": "why? v1", "question": "why?", "confidence": 0.75}
+    assert _ask(daemon, files)["content"] == "why? v1"
+    assert len(loads) == 1
+
+
+@pytest.mark.parametrize("key", ["database", "vectors", "embedder"])
+def test_different_files_are_rejected(daemon, files, tmp_path, key):
+    assert _ask(daemon, files, **{key: str(tmp_path / "other")}) is None
+
+
+def test_rewritten_files_are_reloaded(daemon, files, loads):
+    assert _ask(daemon, files)["content"] == "why? v1"
+
+    stat = os.stat(files["vectors"])
+    os.utime(files["vectors"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    assert _ask(daemon, files)["content"] == "why? v2"
+    assert len(loads) == 2
+
+
+def test_malformed_requests_do_not_kill_connection(daemon):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(daemon)
+        with connection.makefile("rw", encoding="UTF-8") as stream:
+            replies = []
+            for line in ["[1]", "not json", json.dumps({"command": "ping"})]:
+                stream.write(line + "\n")
+                stream.flush()
+                replies.append(json.loads(stream.readline()))
+
+    assert "error" in replies[0]
+    assert "error" in replies[1]
+    assert "error" not in replies[2]
+
+
+def test_imports_are_deferred():
+    # Importing the CLI modules must not pull in the slow libraries only some commands need
+    code = "import sys, questionanswering.answers, questionanswering.embeddings, questionanswering.daemon; print(sorted(m for m in ('gensim', 'scipy', 'faker', 'sklearn') if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+    assert output.strip() == "[]"
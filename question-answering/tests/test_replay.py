@@ -0,0 +1,100 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+import threading
+import json
+import time
+
+import pytest
+
+from questionanswering.replay import _Target, _percentile, _replay_all, _request_body, _schedule
+
+
+def _serve(delay: float, body: bytes) -> Iterator[str]:
+    class _Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: object) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "http://127.0.0.1:{}".format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+_ANSWER = json.dumps({"content": "answer", "question": "question", "confidence": 0.9}).encode("UTF-8")
+
+
+@pytest.fixture
+def fast_server() -> Iterator[str]:
+    yield from _serve(0.0, _ANSWER)
+
+
+@pytest.fixture
+def slow_server() -> Iterator[str]:
+    yield from _serve(0.3, _ANSWER)
+
+
+@pytest.fixture
+def broken_server() -> Iterator[str]:
+    yield from _serve(0.0, b"<html>not json</html>")
+
+
+def test_schedule_uses_earliest_arrival_as_origin():
+    records = [{"timestamp": 10.0}, {"timestamp": 9.5}, {"timestamp": 10.2}]
+
+    assert _schedule(records, 1.0, None) == pytest.approx([0.5, 0.0, 0.7])
+    assert _schedule(records, 2.0, None) == pytest.approx([0.25, 0.0, 0.35])
+
+
+def test_schedule_at_fixed_rate_ignores_timestamps():
+    records = [{"timestamp": 10.0}, {"timestamp": 9.5}, {"timestamp": 10.2}]
+
+    assert _schedule(records, 1.0, 4.0) == pytest.approx([0.0, 0.25, 0.5])
+
+
+def test_percentile_uses_nearest_rank():
+    ordered = [float(i) for i in range(1, 101)]
+
+    assert _percentile(ordered, 50) == 50.0
+    assert _percentile(ordered, 95) == 95.0
+    assert _percentile(ordered, 99) == 99.0
+    assert _percentile([3.0], 99) == 3.0
+
+
+def test_request_body_reproduces_recorded_failures():
+    assert json.loads(_request_body({"question": "why?", "status": 200})) == {"question": "why?"}
+    assert json.loads(_request_body({"question": "why?"})) == {"question": "why?"}
+    assert json.loads(_request_body({"question": None, "status": 400})) == {}
+    with pytest.raises(ValueError):
+        json.loads(_request_body({"question": None, "status": 500}))
+
+
+def test_non_json_answer_counts_as_failure(broken_server):
+    status, answer, latency = _Target(broken_server).ask("/autoguru/answer", b"{}", time.perf_counter())
+
+    assert status is None
+    assert answer is None
+    assert latency >= 0.0
+
+
+def test_slow_target_does_not_delay_baseline(slow_server, fast_server):
+    records = [{"timestamp": float(i), "question": "q{}".format(i)} for i in range(4)]
+    offsets = [0.0] * len(records)
+
+    slow, fast = _replay_all(records, offsets, [_Target(slow_server), _Target(fast_server)], concurrency=1)
+
+    # With one worker the slow target's requests queue behind each other, which shows up in its latency
+    assert all(status == 200 for status, _, _ in slow + fast)
+    assert max(latency for _, _, latency in slow) >= 1.2
+    assert max(latency for _, _, latency in fast) < 0.3
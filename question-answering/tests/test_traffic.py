@@ -0,0 +1,123 @@
+from typing import Any, Dict, List
+import threading
+import os
+
+import pytest
+
+from questionanswering.traffic import TrafficLogger, read_traffic
+
+
+class _BlockingTrafficLogger(TrafficLogger):
+    # Holds the writer thread inside its first write until released, so tests control what is queued
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.batches = []
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        self.batches.append(len(batch))
+        self.writing.set()
+        self.release.wait()
+        super()._write(batch)
+
+
+def _log(logger: TrafficLogger, i: int) -> None:
+    logger.log(endpoint="/autoguru/answer", question="q{}".format(i), confidence=0.5, latency=0.01, timestamp=float(i))
+
+
+def _questions(path: str) -> List[str]:
+    return [record["question"] for record in read_traffic(path)]
+
+
+def test_records_are_written_in_batches(tmp_path):
+    path = str(tmp_path / "traffic.jsonl")
+    logger = _BlockingTrafficLogger(path, batch_size=2, flush_interval=0.01)
+
+    _log(logger, 0)
+    assert logger.writing.wait(5.0)
+    for i in range(1, 6):
+        _log(logger, i)
+    logger.release.set()
+    logger.close()
+
+    assert logger.batches == [1, 2, 2, 1]
+    assert _questions(path) == ["q{}".format(i) for i in range(6)]
+    assert logger.dropped == 0
+
+
+def test_records_are_dropped_when_queue_is_full(tmp_path, capsys):
+    path = str(tmp_path / "traffic.jsonl")
+    logger = _BlockingTrafficLogger(path, queue_size=1, flush_interval=0.01)
+
+    _log(logger, 0)
+    assert logger.writing.wait(5.0)
+    for i in range(1, 4):
+        _log(logger, i)
+    logger.release.set()
+    logger.close()
+
+    assert logger.dropped == 2
+    assert _questions(path) == ["q0", "q1"]
+    assert "dropped 2 records" in capsys.readouterr().out
+
+
+def test_log_is_rotated_by_size(tmp_path):
+    path = str(tmp_path / "traffic.jsonl")
+    logger = TrafficLogger(path, max_bytes=400, backup_count=2, flush_interval=0.01)
+
+    for i in range(20):
+        _log(logger, i)
+    logger.close()
+
+    assert sorted(os.listdir(str(tmp_path))) == ["traffic.jsonl", "traffic.jsonl.1", "traffic.jsonl.2"]
+    for name in os.listdir(str(tmp_path)):
+        assert os.path.getsize(str(tmp_path / name)) <= 400
+
+    # The oldest records fell off the end, the rest are in order across the rotated files
+    questions = _questions(path + ".2") + _questions(path + ".1") + _questions(path)
+    assert questions == ["q{}".format(i) for i in range(20 - len(questions), 20)]
+
+
+def test_rotation_without_backups_truncates(tmp_path):
+    path = str(tmp_path / "traffic.jsonl")
+    logger = TrafficLogger(path, max_bytes=400, backup_count=0, flush_interval=0.01)
+
+    for i in range(20):
+        _log(logger, i)
+    logger.close()
+
+    assert os.listdir(str(tmp_path)) == ["traffic.jsonl"]
+    assert _questions(path)[-1] == "q19"
+
+
+def test_writer_survives_write_errors(tmp_path, capsys):
+    path = str(tmp_path / "traffic.jsonl")
+
+    class _FailingTrafficLogger(_BlockingTrafficLogger):
+        def _write(self, batch: List[Dict[str, Any]]) -> None:
+            if not self.batches:
+                self.batches.append(len(batch))
+                self.writing.set()
+                self.release.wait()
+                raise OSError(28, "No space left on device")
+            super()._write(batch)
+
+    logger = _FailingTrafficLogger(path, flush_interval=0.01)
+    logger.release.set()
+
+    _log(logger, 0)
+    assert logger.writing.wait(5.0)
+    _log(logger, 1)
+    logger.close()
+
+    assert logger.dropped == 1
+    assert _questions(path) == ["q1"]
+    assert "No space left on device" in capsys.readouterr().out
+
+
+def test_invalid_limits_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        TrafficLogger(str(tmp_path / "traffic.jsonl"), max_bytes=0)
+    with pytest.raises(ValueError):
+        TrafficLogger(str(tmp_path / "traffic.jsonl"), backup_count=-1)